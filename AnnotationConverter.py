@@ -8,6 +8,24 @@ import numpy as np
 import logging
 from typing import List, Optional
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_loads(data):
+    """Parses JSON with orjson when available, falling back to json for input it rejects such as NaN or Infinity."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+logger = logging.getLogger(__name__)
+
 
 #%%
 class AnnotationConverter:
@@ -19,8 +37,6 @@ class AnnotationConverter:
             "ann_iscrowd", "labels", "classifications", "augmentation_settings",
             "tile_settings", "False_positive"
         ]
-        logging.basicConfig(level=logging.INFO)
-        self.logger = logging.getLogger(__name__)
 
     def voc_to_dataframe(self, directory_path: str) -> pd.DataFrame:
         """
@@ -32,7 +48,7 @@ class AnnotationConverter:
         Returns:
             pd.DataFrame: DataFrame containing the aggregated annotations.
         """
-        self.logger.info(f"Converting VOC annotations in {directory_path} to DataFrame")
+        logger.info("Converting VOC annotations in %s to DataFrame", directory_path)
 
         img_data = []
         ann_data = []
@@ -44,7 +60,8 @@ class AnnotationConverter:
         annotation_id = 0
 
         try:
-            xml_files = [f for f in os.listdir(directory_path) if f.endswith('.xml')]
+            with os.scandir(directory_path) as entries:
+                xml_files = [entry.name for entry in entries if entry.name.endswith('.xml') and entry.is_file()]
 
             for xml_file in tqdm(xml_files, desc="Processing XML files"):
                 tree = ET.parse(os.path.join(directory_path, xml_file))
@@ -75,7 +92,7 @@ class AnnotationConverter:
 
             return self._prepare_dataframe(img_df, ann_df, cat_df)
         except Exception as e:
-            self.logger.error(f"Error converting VOC to DataFrame: {e}")
+            logger.error("Error converting VOC to DataFrame: %s", e)
             raise
 
     @staticmethod
@@ -108,7 +125,7 @@ class AnnotationConverter:
         }
 
     def coco_to_dataframe(self, folder: str, encoding: str = "utf-8") -> pd.DataFrame:
-        self.logger.info(f"Converting COCO annotations in folder {folder} to DataFrame")
+        logger.info("Converting COCO annotations in folder %s to DataFrame", folder)
 
         image_id_offset = 0
         annotation_id_offset = 0
@@ -121,11 +138,12 @@ class AnnotationConverter:
         category_names_set = set()
 
         try:
-            json_files = [os.path.join(folder, f) for f in os.listdir(folder) if f.endswith('.json')]
+            with os.scandir(folder) as entries:
+                json_files = [entry.path for entry in entries if entry.name.endswith('.json') and entry.is_file()]
 
             for json_file in tqdm(json_files, desc="Processing XML files"):
                 with open(json_file, encoding=encoding) as cocojson:
-                    annotations_json = json.load(cocojson)
+                    annotations_json = json_loads(cocojson.read())
 
                 # Update image IDs to avoid conflicts
                 last_image_id = 0
@@ -163,7 +181,7 @@ class AnnotationConverter:
 
             return self._prepare_dataframe(images_df, annotations_df, categories_df)
         except Exception as e:
-            self.logger.error(f"Error converting COCO to DataFrame: {e}")
+            logger.error("Error converting COCO to DataFrame: %s", e)
             raise
 
     def _prepare_dataframe(self, images_df, annotations_df, categories_df):
@@ -189,7 +207,7 @@ class AnnotationConverter:
         """
         Writes COCO annotation files to disk (in JSON format) and returns the path to files.
         """
-        self.logger.info(f"Converting dataframe to bina_coco and saving it in {output_path}")
+        logger.info("Converting dataframe to bina_coco and saving it in %s", output_path)
 
         df = dataframe.copy(deep=True)
         df = df.replace(r"^\s*$", np.nan, regex=True)
@@ -248,9 +266,9 @@ class AnnotationConverter:
         resultA = mergedA[0].to_json(orient="split", default_handler=str)
         resultC = mergedC[0].to_json(orient="split", default_handler=str)
 
-        parsedI = json.loads(resultI)
-        parsedA = json.loads(resultA)
-        parsedC = json.loads(resultC)
+        parsedI = json_loads(resultI)
+        parsedA = json_loads(resultA)
+        parsedC = json_loads(resultC)
 
         parsedI.update({
             "info": {},
@@ -1,9 +1,10 @@
 #%%
 import shutil
 
-from AnnotationExplorer import AnnotationExplorer
+from annotationExplorer import AnnotationExplorer
 from AnnotationConverter import AnnotationConverter
 import os
+import logging
 
 
 def explore_and_convert(zip_path):
@@ -38,4 +39,6 @@ def delete_folder(output_path):
         shutil.rmtree(output_path)
 
 #%%
-explore_and_convert(zip_path = "Example Datasets/empty.zip")
\ No newline at end of file
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    explore_and_convert(zip_path = "Example Datasets/empty.zip")
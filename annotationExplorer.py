@@ -2,36 +2,114 @@
 
 #%%
 import zipfile
+import codecs
+import re
 import os
 import shutil
+import secrets
 import json
 import xml.etree.ElementTree as ET
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from typing import Tuple, Optional, Dict, List
+from typing import Callable, Tuple, Optional, Dict, List, Set
 
+try:
+    from lxml import etree
+except ImportError:
+    etree = ET
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_loads(data):
+    """Parses JSON with orjson when available, falling back to json for input it rejects such as NaN or Infinity."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+COCO_KEYS = frozenset({'images', 'annotations', 'categories'})
+COCO_KEY_NEEDLES = tuple(f'"{key}"'.encode() for key in COCO_KEYS)
+
+logger = logging.getLogger(__name__)
+
+# Default JSON structure of the coco files, serialized once at import
+DEFAULT_COCO_STRUCTURE = {
+    "info": {},
+    "images": [],
+    "categories": [],
+    "licenses": [],
+    "errors": [],
+    "annotations": [],
+    "labels": [],
+    "classifications": [],
+    "augmentation_settings": {},
+    "tile_settings": {},
+    "False_positive": {}
+}
+DEFAULT_COCO_BYTES = json.dumps(DEFAULT_COCO_STRUCTURE, indent=4).encode()
+
+IMAGE_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'bmp', 'tif', 'tiff', 'webp'})
+
+# Chunk size used when copying images out of the archive
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Only this many leading bytes of a label file are inspected to find its first non-empty line
+YOLO_HEAD_SIZE = 4096
+
+# A YOLO label line: class id followed by four box coordinates
+YOLO_LINE_RE = re.compile(rb'^\s*(?:\d+\.?\d*|\.\d+)(?:[ \t]+(?:\d+\.?\d*|\.\d+)){4}\s*$')
+
+
+
+def file_extension(file_name: str) -> str:
+    """Returns the lowercase extension of a file name, without the dot."""
+    return os.path.splitext(file_name)[1][1:].lower()
+
+
+def unique_file_name(file_name: str, used_names: Set[str]) -> str:
+    """Returns file_name, or file_name with a _1, _2... suffix if it is already in used_names."""
+    base, extension = os.path.splitext(file_name)
+    new_file_name = file_name
+    counter = 1
+    while new_file_name in used_names:
+        new_file_name = f"{base}_{counter}{extension}"
+        counter += 1
+    return new_file_name
 
 
 class AnnotationExplorer:
     def __init__(self, zip_path: str) -> None:
         self.zip_path: str = zip_path
-        # Create the folder structure and get the base directory and other paths
-        self.base_dir, self.train_images_dir, self.cocos_dir, self.annotations_dir = self._create_folder_structure()
-        self.extract_dir: str = "extracted_files"
+        # The folder structure is created by the first organize run, so explore_only leaves nothing on disk
+        self.base_dir: Optional[str] = None
+        self.train_images_dir: Optional[str] = None
+        self.cocos_dir: Optional[str] = None
+        self.annotations_dir: Optional[str] = None
         self.identified_format: Optional[str] = None
         self.num_images: int = 0
         self.num_annotations: int = 0
 
-        # Setup logging
-        logging.basicConfig(level=logging.INFO)
-        self.logger = logging.getLogger(__name__)
-
     def _create_folder_structure(self) -> Tuple[str, str, str, str]:
         """Creates a folder structure based on the name of a given zip file."""
         dataset_name = os.path.basename(self.zip_path)
-        # Create the base directory
-        base_dir = f'converted_{dataset_name}'
-        os.makedirs(base_dir, exist_ok=True)
+        # Atomically create a uniquely named base directory so repeated runs never mix their outputs,
+        # os.mkdir applies the umask like the other output folders
+        while True:
+            base_dir = os.path.join(os.getcwd(), f'converted_{dataset_name}_{secrets.token_hex(4)}')
+            try:
+                os.mkdir(base_dir)
+                break
+            except FileExistsError:
+                continue
 
         # Create the subdirectories
         train_images_dir = os.path.join(base_dir, 'train_images')
@@ -44,137 +122,164 @@ class AnnotationExplorer:
         os.makedirs(cocos_dir, exist_ok=True)
         os.makedirs(annotations_dir, exist_ok=True)
 
-        # Define the default JSON structure
-        default_coco_structure = {
-            "info": {},
-            "images": [],
-            "categories": [],
-            "licenses": [],
-            "errors": [],
-            "annotations": [],
-            "labels": [],
-            "classifications": [],
-            "augmentation_settings": {},
-            "tile_settings": {},
-            "False_positive": {}
-        }
-
-        # List of coco files to create
-        coco_files = ['val_coco.json', 'test_coco.json']
-
         # Create the coco JSON files with the default structure
-        for coco_file in coco_files:
+        for coco_file in ('val_coco.json', 'test_coco.json'):
             coco_file_path = os.path.join(cocos_dir, coco_file)
-            with open(coco_file_path, 'w') as f:
-                json.dump(default_coco_structure, f, indent=4)
+            with open(coco_file_path, 'wb') as f:
+                f.write(DEFAULT_COCO_BYTES)
 
-        # self.logger.info(f"creating folders structure")
+        logger.debug("Folder structure created under %s", base_dir)
 
         return base_dir, train_images_dir, cocos_dir, annotations_dir
 
-    def extract_zip(self) -> None:
-        """Extracts the zip file to a temporary directory."""
-        os.makedirs(self.extract_dir, exist_ok=True)
-        with zipfile.ZipFile(self.zip_path, 'r') as zip_ref:
-            zip_ref.extractall(self.extract_dir)
-        self.logger.info(f"Extracted zip file to {self.extract_dir}")
-
     def organize_files_and_identify_format(self) -> None:
-        """Identifies the annotation format and organizes files into separate folders."""
-        annotations_dir = self.annotations_dir
+        """
+        Streams the zip members into separate folders and identifies the annotation format.
+
+        The format is that of the first annotation member, in archive order, that passes its checker.
+        Only members with that format's extension are organized as annotations.
+        """
+        if self.base_dir is None:
+            self.base_dir, self.train_images_dir, self.cocos_dir, self.annotations_dir = self._create_folder_structure()
         images_dir = self.train_images_dir
+        destination_folders = {
+            'xml': os.path.join(self.annotations_dir, 'xml'),
+            'txt': os.path.join(self.annotations_dir, 'yolo'),
+            'json': os.path.join(self.annotations_dir, 'coco'),
+        }
+        for folder in destination_folders.values():
+            os.makedirs(folder, exist_ok=True)
+
+        with zipfile.ZipFile(self.zip_path, 'r') as zip_ref:
+            infos = [info for info in zip_ref.infolist() if not info.is_dir()]
+            # The format is settled here, before any worker runs, so the result never depends on thread timing
+            identified_info, annotation_ext, annotation_format = self._identify_format(zip_ref, infos)
+
+        is_format = self._format_checkers()[annotation_ext][0] if annotation_ext else None
+        destination_folder = destination_folders.get(annotation_ext)
+
+        # Destination names are chosen here in archive order, so no two workers ever write the same path.
+        # Flattened images keep the last member with a given name, annotations get _1, _2... suffixes.
+        # Every image member is counted, as in explore_only, even when a later one replaces it on disk.
+        image_tasks: Dict[str, zipfile.ZipInfo] = {}
+        num_images = 0
+        annotation_tasks: List[Tuple[zipfile.ZipInfo, str, Optional[Callable[[bytes], bool]]]] = []
+        used_names = set()
+        for info in infos:
+            file = os.path.basename(info.filename)
+            ext = file_extension(file)
+            if ext in IMAGE_EXTENSIONS:
+                image_tasks[os.path.join(images_dir, file)] = info
+                num_images += 1
+            elif ext == annotation_ext:
+                file = unique_file_name(file, used_names)
+                used_names.add(file)
+                # The member that identified the format has already passed its checker, so it is copied as is
+                checker = None if info is identified_info else is_format
+                annotation_tasks.append((info, os.path.join(destination_folder, file), checker))
+        tasks = [(info, path, None) for path, info in image_tasks.items()]
+        tasks += annotation_tasks
+
+        # ZipFile handles are not safe for concurrent reads, so every worker thread opens its own
+        thread_data = threading.local()
+        zip_handles: List[zipfile.ZipFile] = []
+
+        def process(task: Tuple[zipfile.ZipInfo, str, Optional[Callable[[bytes], bool]]]) -> bool:
+            zip_ref = getattr(thread_data, 'zip_ref', None)
+            if zip_ref is None:
+                zip_ref = thread_data.zip_ref = zipfile.ZipFile(self.zip_path, 'r')
+                zip_handles.append(zip_ref)
+            return self._process_member(zip_ref, *task)
 
-        for root, _, files in os.walk(self.extract_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                if file.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    shutil.move(file_path, os.path.join(images_dir, file))
-                    self.num_images += 1
-                elif file.endswith('.xml'):
-                    if self._is_pascal_voc(file_path):
-                        self._move_file(file_path, os.path.join(annotations_dir, 'xml'))
-                        self.identified_format = 'Pascal VOC'
-                        self.num_annotations += 1
-                elif file.endswith('.txt'):
-                    if self._is_yolo(file_path):
-                        self._move_file(file_path, os.path.join(annotations_dir, 'yolo'))
-                        self.identified_format = 'YOLO'
-                        self.num_annotations += 1
-                elif file.endswith('.json'):
-                    if self._is_coco(file_path):
-                        self._move_file(file_path, os.path.join(annotations_dir, 'coco'))
-                        self.identified_format = 'COCO'
-                        self.num_annotations += 1
-
-        self.logger.info(f"Moved and Organized files, the identified format is: {self.identified_format}")
-
-    def _move_file(self, file_path: str, destination_folder: str) -> None:
-        """Moves a file to the specified destination folder, renaming the file if necessary to avoid collisions."""
-        os.makedirs(destination_folder, exist_ok=True)
-
-        file_name = os.path.basename(file_path)
-        destination_path = os.path.join(destination_folder, file_name)
-        base, extension = os.path.splitext(file_name)
-        counter = 1
-
-        while os.path.exists(destination_path):
-            new_file_name = f"{base}_{counter}{extension}"
-            destination_path = os.path.join(destination_folder, new_file_name)
-            counter += 1
-
-        shutil.move(file_path, destination_path)
-
-    def _is_pascal_voc(self, file_path: str) -> bool:
-        """Checks if the file is a Pascal VOC XML annotation."""
         try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            if root.tag == 'annotation' and root.find('object') is not None:
-                return True
-        except ET.ParseError:
-            pass
-        return False
+            with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+                results = list(executor.map(process, tasks))
+        finally:
+            for zip_ref in zip_handles:
+                zip_ref.close()
+
+        self.num_images += num_images
+        self.num_annotations += sum(results[len(image_tasks):])
+        self.identified_format = annotation_format
+
+        logger.info("Organized files, the identified format is: %s", self.identified_format)
+
+    def _format_checkers(self) -> Dict[str, Tuple[Callable[[bytes], bool], str]]:
+        """Maps each annotation extension to its format checker and format name."""
+        return {
+            'xml': (self._is_pascal_voc, 'Pascal VOC'),
+            'txt': (self._is_yolo, 'YOLO'),
+            'json': (self._is_coco, 'COCO'),
+        }
+
+    def _identify_format(self, zip_ref: zipfile.ZipFile, infos: List[zipfile.ZipInfo]
+                         ) -> Tuple[Optional[zipfile.ZipInfo], Optional[str], Optional[str]]:
+        """Returns the first annotation member, in archive order, that passes its checker, with its extension and format name."""
+        checkers = self._format_checkers()
+        for info in infos:
+            ext = file_extension(info.filename)
+            checker = checkers.get(ext)
+            if checker is not None and checker[0](zip_ref.read(info)):
+                return info, ext, checker[1]
+        return None, None, None
+
+    def _process_member(self, zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, destination_path: str,
+                        is_format: Optional[Callable[[bytes], bool]]) -> bool:
+        """Writes a single zip member to its destination, copying it as is when is_format is None."""
+        if is_format is None:
+            with zip_ref.open(info) as src, open(destination_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+            return True
 
-    def _is_yolo(self, file_path: str) -> bool:
-        """Checks if the file is a YOLO annotation."""
+        data = zip_ref.read(info)
+        if not is_format(data):
+            return False
+        with open(destination_path, 'wb') as f:
+            f.write(data)
+        return True
+
+    def _is_pascal_voc(self, data: bytes) -> bool:
+        """Checks if the data is a Pascal VOC XML annotation."""
+        # Reject documents without the VOC tags before spinning up a parser. The byte search only works for
+        # ASCII-compatible encodings, so UTF-16/32 documents (BOM or NUL bytes up front) go straight to the parser.
+        ascii_compatible = not data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)) and b'\x00' not in data[:4]
+        if ascii_compatible and (b'<annotation' not in data or b'<object' not in data):
+            return False
         try:
-            with open(file_path, 'r') as file:
-                lines = file.readlines()
-                for line in lines:
-                    parts = line.strip().split()
-                    if len(parts) == 5 and all(part.replace('.', '', 1).isdigit() for part in parts):
-                        return True
-        except Exception:
+            root = etree.fromstring(data)
+            return root.tag == 'annotation' and root.find('object') is not None
+        except etree.ParseError:
             pass
         return False
 
-    def _is_coco(self, file_path: str) -> bool:
-        """Checks if the file is a COCO JSON annotation."""
+    def _is_yolo(self, data: bytes) -> bool:
+        """Checks if the data is a YOLO annotation."""
+        # Label files are homogeneous, so the first non-empty line decides the format
+        head = data[:YOLO_HEAD_SIZE]
+        if head.startswith(codecs.BOM_UTF8):
+            head = head[len(codecs.BOM_UTF8):]
+        for line in head.splitlines():
+            if line.strip():
+                return YOLO_LINE_RE.match(line) is not None
+        return False
+
+    def _is_coco(self, data: bytes) -> bool:
+        """Checks if the data is a COCO JSON annotation."""
+        # A plain substring scan rejects most non-COCO JSON without parsing it
+        if not all(needle in data for needle in COCO_KEY_NEEDLES):
+            return False
+
         try:
-            with open(file_path, 'r') as file:
-                data = json.load(file)
-                if 'annotations' in data and 'images' in data and 'categories' in data:
-                    return True
-        except json.JSONDecodeError:
+            parsed = json_loads(data)
+            if isinstance(parsed, dict) and COCO_KEYS <= parsed.keys():
+                return True
+        except ValueError:
             pass
         return False
 
-    def cleanup(self) -> None:
-        """Cleans up the extracted files while keeping organized images and annotations folders."""
-        for root, dirs, files in os.walk(self.extract_dir, topdown=False):
-            for file in files:
-                os.remove(os.path.join(root, file))
-            for dir in dirs:
-                shutil.rmtree(os.path.join(root, dir))
-        if os.path.exists(self.extract_dir):
-            os.rmdir(self.extract_dir)
-        self.logger.info(f"Cleaned up extracted files in {self.extract_dir}")
-
     def explore_and_organize(self) -> Dict[str, Optional[str]]:
-        """Main method to extract, organize, identify format, and cleanup."""
-        self.extract_zip()
+        """Main method to organize the zip contents and identify the format."""
         self.organize_files_and_identify_format()
-        self.cleanup()
         return {
             'dataset_name': os.path.basename(self.zip_path),
             'annotation_format': self.identified_format,
@@ -182,7 +287,29 @@ class AnnotationExplorer:
             'num_annotations_files': self.num_annotations
         }
 
+    def explore_only(self) -> Dict[str, Optional[str]]:
+        """
+        Identifies the annotation format from the zip's central directory without extracting it.
+
+        Nothing is written to disk. The format follows the same rule as organize_files_and_identify_format,
+        the first annotation member in archive order that passes its checker, so both methods agree.
+        The annotation count is the number of members sharing that format's extension, these are not
+        validated one by one.
+        """
+        with zipfile.ZipFile(self.zip_path, 'r') as zip_ref:
+            infos = [info for info in zip_ref.infolist() if not info.is_dir()]
+            _, annotation_ext, identified_format = self._identify_format(zip_ref, infos)
+
+        extensions = [file_extension(info.filename) for info in infos]
+        return {
+            'dataset_name': os.path.basename(self.zip_path),
+            'annotation_format': identified_format,
+            'num_images': sum(ext in IMAGE_EXTENSIONS for ext in extensions),
+            'num_annotations_files': extensions.count(annotation_ext) if annotation_ext else 0
+        }
+
 #%% Example usage:
-# explorer = AnnotationExplorer("New folder/CarLicencePlate.zip")
-# results = explorer.explore_and_organize()
-# print(results)
+if __name__ == "__main__":
+    explorer = AnnotationExplorer("Example Datasets/Dental_1.v4i.coco.zip")
+    results = explorer.explore_and_organize()
+    print(results)